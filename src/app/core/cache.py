@@ -0,0 +1,471 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import update_wrapper
+from typing import Any, Callable, Hashable, Literal, NamedTuple, Optional
+
+from app.core.request_context import RequestContext
+
+_logger = logging.getLogger(__name__)
+
+# indirection to allow tests to control time
+_now = time.monotonic
+
+_KWARGS_MARK = object()
+_FAST_TYPES = {int, str}
+
+CacheScope = Literal["request", "process"]
+
+# shared by all the sync functions, so that stale-while-revalidate doesn't spawn a thread per refresh
+_REFRESH_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="cache-refresh"
+)
+
+
+def _make_key(args: tuple, kwargs: dict) -> Hashable:
+    """
+    Builds a flat, hashable key from the call arguments (see functools._make_key).
+    Single int/str arguments are used as-is, avoiding the cost of hashing a tuple.
+    """
+    if not kwargs and len(args) == 1 and type(args[0]) in _FAST_TYPES:
+        return args[0]
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK,)
+        for item in kwargs.items():
+            key += item
+    return _HashedSeq(key)
+
+
+class _HashedSeq(list):
+    """
+    Key that computes its hash once, as it is hashed multiple times per lookup.
+    """
+
+    __slots__ = ("hashvalue",)
+
+    def __init__(self, values: tuple) -> None:
+        super().__init__(values)
+        self.hashvalue = hash(values)
+
+    def __hash__(self) -> int:
+        return self.hashvalue
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    stale_hits: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / lookups if lookups else 0.0
+
+
+class _CacheEntry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float) -> None:
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class _LRUCache:
+    """
+    Thread-safe bounded LRU cache, with optional TTL and stale-while-revalidate window.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+    ) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl or 0.0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, _CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> tuple[bool, Any, bool]:
+        """
+        Returns a (found, value, is_stale) tuple.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None, False
+            now = _now()
+            if now < entry.fresh_until:
+                self._data.move_to_end(key)
+                return True, entry.value, False
+            if now < entry.stale_until:
+                self._data.move_to_end(key)
+                return True, entry.value, True
+            del self._data[key]
+            return False, None, False
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl is None:
+            fresh_until = stale_until = float("inf")
+        else:
+            fresh_until = _now() + self.ttl
+            stale_until = fresh_until + self.stale_ttl
+        with self._lock:
+            self._data[key] = _CacheEntry(value, fresh_until, stale_until)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class _InFlight:
+    """
+    A running computation of the process cache.
+    """
+
+    __slots__ = ("future", "generation", "owner")
+
+    def __init__(self, generation: int, owner: Optional[int]) -> None:
+        self.future = concurrent.futures.Future()
+        # the cache generation when the computation started, see _Memoizer._store_if_current
+        self.generation = generation
+        # the id of the thread running the computation
+        self.owner = owner
+
+
+class _Memoizer:
+    def __init__(
+        self,
+        f: Callable,
+        scope: CacheScope,
+        maxsize: int,
+        ttl: Optional[float],
+        stale_ttl: Optional[float],
+        key: Optional[Callable[..., Hashable]],
+        event_name: Optional[str],
+    ) -> None:
+        super().__init__()
+        if scope not in ("request", "process"):
+            raise ValueError(f"invalid cache scope '{scope}'")
+        if stale_ttl and ttl is None:
+            raise ValueError("stale_ttl requires ttl")
+        self.f = f
+        self.scope = scope
+        self.key = key
+        self.event_name = event_name or f"cache-{f.__name__}"
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._store = (
+            _LRUCache(maxsize, ttl=ttl, stale_ttl=stale_ttl)
+            if scope == "process"
+            else None
+        )
+        self._lock = threading.Lock()
+        # bumped on invalidation, so that computations started before don't store outdated values
+        self._generation = 0
+        self._in_flight: dict[Hashable, _InFlight] = {}
+        # tasks are bound to their event loop, so async computations are only shared within the same loop
+        self._in_flight_async: dict[
+            tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task
+        ] = {}
+        self._background_tasks: set[asyncio.Task] = set()
+
+    def make_key(self, args: tuple, kwargs: dict) -> Hashable:
+        return self.key(*args, **kwargs) if self.key else _make_key(args, kwargs)
+
+    def _lookup(
+        self, key: Hashable, request_cache: Optional[dict]
+    ) -> tuple[bool, Any, bool]:
+        """
+        Looks up the request scoped cache first, then the process scoped one. Values found in the process cache are
+        copied to the request cache, so the same value is returned for the whole duration of a request.
+        """
+        event = RequestContext.server_timing_aggregated_event(self.event_name)
+        start = time.perf_counter() if event else 0.0
+        if request_cache is not None and key in request_cache:
+            found, value, is_stale = True, request_cache[key], False
+        elif self._store is not None:
+            found, value, is_stale = self._store.get(key)
+            if found and request_cache is not None:
+                request_cache[key] = value
+        else:
+            found, value, is_stale = False, None, False
+        with self._lock:
+            if not found:
+                self.misses += 1
+            elif is_stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+        if event:
+            event.record(time.perf_counter() - start)
+        return found, value, is_stale
+
+    def _store_if_current(self, key: Hashable, value: Any, generation: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self._store.set(key, value)
+
+    def call(self, args: tuple, kwargs: dict) -> Any:
+        key = self.make_key(args, kwargs)
+        request_cache = RequestContext._request_cache(self)
+        found, value, is_stale = self._lookup(key, request_cache)
+        if found:
+            if is_stale:
+                self._refresh(key, args, kwargs)
+            return value
+        if self._store is None:
+            # request scope: a request doesn't need stampede protection, nor can share computations with others
+            value = self.f(*args, **kwargs)
+        else:
+            value = self._load(key, args, kwargs)
+        if request_cache is not None:
+            request_cache[key] = value
+        return value
+
+    def _load(self, key: Hashable, args: tuple, kwargs: dict) -> Any:
+        # stampede protection: concurrent misses on the same key wait for a single computation
+        with self._lock:
+            entry = self._in_flight.get(key)
+            is_owner = entry is None
+            if is_owner:
+                entry = _InFlight(self._generation, threading.get_ident())
+                self._in_flight[key] = entry
+        if not is_owner:
+            if entry.owner == threading.get_ident():
+                raise RuntimeError(f"recursive call of {self.f.__name__} with same key")
+            return entry.future.result()
+        return self._compute(key, entry, args, kwargs)
+
+    def _compute(
+        self, key: Hashable, entry: _InFlight, args: tuple, kwargs: dict
+    ) -> Any:
+        entry.owner = threading.get_ident()
+        try:
+            value = self.f(*args, **kwargs)
+        except BaseException as e:
+            entry.future.set_exception(e)
+            raise
+        else:
+            self._store_if_current(key, value, entry.generation)
+            entry.future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is entry:
+                    del self._in_flight[key]
+
+    def _refresh(self, key: Hashable, args: tuple, kwargs: dict) -> None:
+        # registered before submitting, so that a burst of stale hits starts a single refresh
+        with self._lock:
+            if key in self._in_flight:
+                return
+            entry = _InFlight(self._generation, None)
+            self._in_flight[key] = entry
+        _REFRESH_EXECUTOR.submit(self._refresh_in_background, key, entry, args, kwargs)
+
+    def _refresh_in_background(
+        self, key: Hashable, entry: _InFlight, args: tuple, kwargs: dict
+    ) -> None:
+        try:
+            self._compute(key, entry, args, kwargs)
+        except Exception as e:
+            _logger.warning(f"background refresh of {self.event_name} failed: {e!r}")
+
+    async def call_async(self, args: tuple, kwargs: dict) -> Any:
+        key = self.make_key(args, kwargs)
+        request_cache = RequestContext._request_cache(self)
+        found, value, is_stale = self._lookup(key, request_cache)
+        if found:
+            if is_stale:
+                # refresh outside the request context, so it doesn't touch the request's cache and timings
+                task, is_new = self._get_or_create_task(
+                    key, args, kwargs, context=contextvars.Context()
+                )
+                if is_new:
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._on_refresh_done)
+            return value
+        if self._store is None:
+            # request scope: a request doesn't need stampede protection, nor can share computations with others
+            value = await self.f(*args, **kwargs)
+        else:
+            value = await self._load_async(key, args, kwargs)
+        if request_cache is not None:
+            request_cache[key] = value
+        return value
+
+    async def _load_async(self, key: Hashable, args: tuple, kwargs: dict) -> Any:
+        # stampede protection: concurrent misses on the same key wait for a single computation, that runs in its own
+        # task so that cancelling any of the callers (e.g. on client disconnect) doesn't affect the others
+        task, _ = self._get_or_create_task(key, args, kwargs)
+        if task is asyncio.current_task():
+            raise RuntimeError(f"recursive call of {self.f.__name__} with same key")
+        return await asyncio.shield(task)
+
+    def _get_or_create_task(
+        self,
+        key: Hashable,
+        args: tuple,
+        kwargs: dict,
+        context: Optional[contextvars.Context] = None,
+    ) -> tuple[asyncio.Task, bool]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._in_flight_async.get((loop, key))
+            if task is not None:
+                return task, False
+            task = loop.create_task(
+                self._compute_async(key, self._generation, args, kwargs),
+                context=context,
+            )
+            self._in_flight_async[(loop, key)] = task
+            return task, True
+
+    async def _compute_async(
+        self, key: Hashable, generation: int, args: tuple, kwargs: dict
+    ) -> Any:
+        try:
+            value = await self.f(*args, **kwargs)
+            self._store_if_current(key, value, generation)
+            return value
+        finally:
+            in_flight_key = (asyncio.get_running_loop(), key)
+            with self._lock:
+                if self._in_flight_async.get(in_flight_key) is asyncio.current_task():
+                    del self._in_flight_async[in_flight_key]
+
+    def _on_refresh_done(self, task: asyncio.Task) -> None:
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            _logger.warning(
+                f"background refresh of {self.event_name} failed: {task.exception()!r}"
+            )
+
+    def invalidate(self, args: tuple, kwargs: dict) -> None:
+        key = self.make_key(args, kwargs)
+        with self._lock:
+            self._generation += 1
+            if self._store is not None:
+                self._store.invalidate(key)
+            # callers arriving from now on start a fresh computation
+            self._in_flight.pop(key, None)
+            for in_flight_key in [k for k in self._in_flight_async if k[1] == key]:
+                del self._in_flight_async[in_flight_key]
+        request_cache = RequestContext._request_cache(self)
+        if request_cache is not None:
+            request_cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._store is not None:
+                self._store.clear()
+            self._in_flight.clear()
+            self._in_flight_async.clear()
+        request_cache = RequestContext._request_cache(self)
+        if request_cache is not None:
+            request_cache.clear()
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            stale_hits=self.stale_hits,
+            evictions=self._store.evictions if self._store else 0,
+            maxsize=self._store.maxsize if self._store else 0,
+            currsize=len(self._store) if self._store else 0,
+        )
+
+
+def cached(
+    scope: CacheScope = "process",
+    maxsize: int = 128,
+    ttl: Optional[float] = None,
+    stale_ttl: Optional[float] = None,
+    key: Optional[Callable[..., Hashable]] = None,
+    event_name: Optional[str] = None,
+):
+    """
+    Use to memoize expensive pure functions, either sync or async.
+    @param scope- "request" caches the result until the end of the current request, "process" caches the result in
+    a bounded LRU shared by all requests (values are also pinned to the current request, so they don't change while
+    the request is being processed)
+    @param maxsize- the max number of entries of the process cache
+    @param ttl- the seconds after which a process cache entry expires, None means never
+    @param stale_ttl- the seconds after the ttl during which the stale value is returned while it is refreshed in
+    background
+    @param key- a function that computes the cache key from the call arguments, defaults to hashing the arguments
+    @param event_name- the server-timing event name of the cache lookups, defaults to `cache-{function name}`
+
+    Example:
+        ```
+        @cached(ttl=60, stale_ttl=30)
+        async def get_permissions(user_id: str):
+            ...
+
+        get_permissions.cache_invalidate(user_id)
+        get_permissions.cache_info().hit_rate
+        ```
+    The code here above will add the entry `cache-get_permissions;dur={elapsed};desc="{count} calls"` to the
+    Server-Timing response header, summing up all the lookups of the request.
+    """
+
+    def decorator(f):
+        memoizer = _Memoizer(
+            f,
+            scope=scope,
+            maxsize=maxsize,
+            ttl=ttl,
+            stale_ttl=stale_ttl,
+            key=key,
+            event_name=event_name,
+        )
+
+        if inspect.iscoroutinefunction(f):
+
+            async def async_wrapped_function(*args, **kwargs):
+                return await memoizer.call_async(args, kwargs)
+
+            wrapper = update_wrapper(async_wrapped_function, f)
+
+        else:
+
+            def wrapped_function(*args, **kwargs):
+                return memoizer.call(args, kwargs)
+
+            wrapper = update_wrapper(wrapped_function, f)
+
+        wrapper.cache_info = memoizer.info
+        wrapper.cache_clear = memoizer.clear
+        wrapper.cache_invalidate = lambda *args, **kwargs: memoizer.invalidate(
+            args, kwargs
+        )
+        return wrapper
+
+    return decorator
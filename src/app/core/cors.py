@@ -1,14 +1,282 @@
+import functools
 import os
+import re
+import typing
 
 import fastapi
-from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.cors import ALL_METHODS, SAFELISTED_HEADERS
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.utils.getenv import getenv_bool
 
+# Request header values longer than this are not cached. Cache keys are client-controlled and preflight responses
+# mirror the requested headers, so each entry costs about twice its key size: the cap bounds the memory of each cache
+# to about cache_size * 2 * _MAX_CACHEABLE_SIZE bytes (~4MB with the defaults), instead of twice the server's max
+# header size per entry.
+_MAX_CACHEABLE_SIZE = 2048
+
+_RawHeaders = list[tuple[bytes, bytes]]
+
+
+def _encode_headers(headers: dict[str, str]) -> _RawHeaders:
+    return [
+        (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()
+    ]
+
+
+class _HeaderSet:
+    """
+    Prebuilt raw headers to be merged into a response, overriding any header with the same name except Vary.
+    """
+
+    __slots__ = ("headers", "names", "vary")
+
+    def __init__(self, headers: dict[str, str]) -> None:
+        raw = _encode_headers(headers)
+        self.vary = next((v for k, v in raw if k == b"vary"), None)
+        self.headers = [(k, v) for k, v in raw if k != b"vary"]
+        self.names = frozenset(k for k, _ in self.headers)
+
+    def merge_into(self, message: Message) -> None:
+        headers = message.get("headers") or []
+        merged = [(k, v) for k, v in headers if k not in self.names]
+        merged.extend(self.headers)
+        if self.vary is not None:
+            for i, (k, v) in enumerate(merged):
+                if k == b"vary":
+                    merged[i] = (k, v + b", " + self.vary)
+                    break
+            else:
+                merged.append((b"vary", self.vary))
+        message["headers"] = merged
+
+
+class CORSMiddleware:
+    """
+    Drop-in replacement of starlette.middleware.cors.CORSMiddleware (same semantics), where origin rules are
+    precompiled, and origin decisions and preflight responses are memoized in bounded LRU caches, so that the
+    hot path is a dict lookup instead of a regex match and header building.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        allow_origins: typing.Sequence[str] = (),
+        allow_methods: typing.Sequence[str] = ("GET",),
+        allow_headers: typing.Sequence[str] = (),
+        allow_credentials: bool = False,
+        allow_origin_regex: str | None = None,
+        expose_headers: typing.Sequence[str] = (),
+        max_age: int = 600,
+        cache_size: int = 1024,
+    ) -> None:
+        if "*" in allow_methods:
+            allow_methods = ALL_METHODS
+
+        self.app = app
+        self.allow_all_origins = "*" in allow_origins
+        self.allow_all_headers = "*" in allow_headers
+        self.allow_credentials = allow_credentials
+        self.allow_origins = frozenset(allow_origins)
+        self.allow_origin_regex = (
+            re.compile(allow_origin_regex) if allow_origin_regex is not None else None
+        )
+        self.allow_methods = frozenset(allow_methods)
+        self.allow_headers = frozenset(
+            h.lower() for h in SAFELISTED_HEADERS | set(allow_headers)
+        )
+        self.preflight_explicit_allow_origin = (
+            not self.allow_all_origins or allow_credentials
+        )
+
+        simple_headers = {}
+        if self.allow_all_origins:
+            simple_headers["Access-Control-Allow-Origin"] = "*"
+        if allow_credentials:
+            simple_headers["Access-Control-Allow-Credentials"] = "true"
+        if expose_headers:
+            simple_headers["Access-Control-Expose-Headers"] = ", ".join(expose_headers)
+        self.simple_headers = simple_headers
+
+        preflight_headers = {}
+        if self.preflight_explicit_allow_origin:
+            # The origin value will be set in _preflight_response() if it is allowed.
+            preflight_headers["Vary"] = "Origin"
+        else:
+            preflight_headers["Access-Control-Allow-Origin"] = "*"
+        preflight_headers["Access-Control-Allow-Methods"] = ", ".join(allow_methods)
+        preflight_headers["Access-Control-Max-Age"] = str(max_age)
+        if not self.allow_all_headers:
+            preflight_headers["Access-Control-Allow-Headers"] = ", ".join(
+                sorted(SAFELISTED_HEADERS | set(allow_headers))
+            )
+        if allow_credentials:
+            preflight_headers["Access-Control-Allow-Credentials"] = "true"
+        self.preflight_headers = preflight_headers
+
+        # per-instance bounded caches, keys are raw request header values (see _MAX_CACHEABLE_SIZE)
+        self.is_allowed_origin = functools.lru_cache(maxsize=cache_size)(
+            self._is_allowed_origin
+        )
+        self._simple_response_headers = functools.lru_cache(maxsize=cache_size)(
+            self._build_simple_response_headers
+        )
+        self._preflight_response = functools.lru_cache(maxsize=cache_size)(
+            self._build_preflight_response
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_method = request_headers = None
+        has_cookie = False
+        # same as starlette's Headers.get, the first occurrence of a header wins
+        for k, v in scope["headers"]:
+            if k == b"origin":
+                if origin is None:
+                    origin = v
+            elif k == b"access-control-request-method":
+                if request_method is None:
+                    request_method = v
+            elif k == b"access-control-request-headers":
+                if request_headers is None:
+                    request_headers = v
+            elif k == b"cookie":
+                has_cookie = True
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        is_cacheable = (
+            len(origin) + len(request_headers or b"") + len(request_method or b"")
+            <= _MAX_CACHEABLE_SIZE
+        )
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            if is_cacheable:
+                start, body = self._preflight_response(
+                    origin, request_method, request_headers
+                )
+            else:
+                start, body = self._build_preflight_response(
+                    origin,
+                    request_method,
+                    request_headers,
+                    is_allowed_origin=self._is_allowed_origin,
+                )
+            # copy the cached messages, outer middlewares may mutate them
+            await send({**start, "headers": list(start["headers"])})
+            await send(dict(body))
+            return
+
+        if is_cacheable:
+            header_set = self._simple_response_headers(origin, has_cookie)
+        else:
+            header_set = self._build_simple_response_headers(
+                origin, has_cookie, is_allowed_origin=self._is_allowed_origin
+            )
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                header_set.merge_into(message)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _is_allowed_origin(self, origin: str) -> bool:
+        if self.allow_all_origins:
+            return True
+        if self.allow_origin_regex is not None and self.allow_origin_regex.fullmatch(
+            origin
+        ):
+            return True
+        return origin in self.allow_origins
+
+    def _build_simple_response_headers(
+        self,
+        raw_origin: bytes,
+        has_cookie: bool,
+        is_allowed_origin: typing.Callable[[str], bool] | None = None,
+    ) -> _HeaderSet:
+        """
+        @param is_allowed_origin- the origin check, defaults to the cached one (pass _is_allowed_origin when the
+        request is not cacheable)
+        """
+        is_allowed_origin = is_allowed_origin or self.is_allowed_origin
+        origin = raw_origin.decode("latin-1")
+        headers = dict(self.simple_headers)
+        # If request includes any cookie headers, then we must respond with the specific origin instead of '*'.
+        # If we only allow specific origins, then we have to mirror back the Origin header in the response.
+        if (self.allow_all_origins and has_cookie) or (
+            not self.allow_all_origins and is_allowed_origin(origin)
+        ):
+            headers["Access-Control-Allow-Origin"] = origin
+            headers["Vary"] = "Origin"
+        return _HeaderSet(headers)
+
+    def _build_preflight_response(
+        self,
+        raw_origin: bytes,
+        raw_method: bytes,
+        raw_requested_headers: bytes | None,
+        is_allowed_origin: typing.Callable[[str], bool] | None = None,
+    ) -> tuple[Message, Message]:
+        """
+        @param is_allowed_origin- the origin check, defaults to the cached one (pass _is_allowed_origin when the
+        request is not cacheable)
+        """
+        is_allowed_origin = is_allowed_origin or self.is_allowed_origin
+        origin = raw_origin.decode("latin-1")
+        requested_headers = (
+            raw_requested_headers.decode("latin-1")
+            if raw_requested_headers is not None
+            else None
+        )
+        headers = dict(self.preflight_headers)
+        failures = []
+
+        if is_allowed_origin(origin):
+            if self.preflight_explicit_allow_origin:
+                headers["Access-Control-Allow-Origin"] = origin
+        else:
+            failures.append("origin")
+
+        if raw_method.decode("latin-1") not in self.allow_methods:
+            failures.append("method")
+
+        # If we allow all headers, then we have to mirror back any requested headers in the response.
+        if self.allow_all_headers and requested_headers is not None:
+            headers["Access-Control-Allow-Headers"] = requested_headers
+        elif requested_headers is not None:
+            for header in requested_headers.split(","):
+                if header.strip().lower() not in self.allow_headers:
+                    failures.append("headers")
+                    break
+
+        if failures:
+            status_code, body = 400, f"Disallowed CORS {', '.join(failures)}".encode()
+        else:
+            status_code, body = 200, b"OK"
+        headers["Content-Length"] = str(len(body))
+        headers["Content-Type"] = "text/plain; charset=utf-8"
+        start = {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": _encode_headers(headers),
+        }
+        return start, {"type": "http.response.body", "body": body}
+
+
+def _getenv_list(key, default: str) -> list[str]:
+    return [v.strip() for v in os.getenv(key, default=default).split(",") if v.strip()]
+
 
 def setup_cors(app: fastapi.FastAPI):
     if getenv_bool("ENABLE_CORS", default=False):
-        allow_origins = os.getenv("CORS_ALLOW_ORIGINS", default="*").split(",")
+        allow_origins = _getenv_list("CORS_ALLOW_ORIGINS", default="*")
         allow_origin_regex = os.getenv("CORS_ALLOW_ORIGIN_REGEX", default=None)
         if allow_origin_regex:
             allow_origins = []
@@ -17,6 +285,9 @@ def setup_cors(app: fastapi.FastAPI):
             allow_origins=allow_origins,
             allow_origin_regex=allow_origin_regex,
             allow_credentials=True,
-            allow_methods=["*"],
-            allow_headers=["*"],
+            allow_methods=[
+                m.upper() for m in _getenv_list("CORS_ALLOW_METHODS", default="*")
+            ],
+            allow_headers=_getenv_list("CORS_ALLOW_HEADERS", default="*"),
+            max_age=int(os.getenv("CORS_MAX_AGE", default=600)),
         )
@@ -4,7 +4,7 @@ import time
 import uuid
 from contextvars import ContextVar
 from functools import update_wrapper
-from typing import Optional, List
+from typing import Hashable, List, Optional
 
 import fastapi
 from starlette.datastructures import MutableHeaders
@@ -12,7 +12,9 @@ from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 _ADDITIONAL_HEADERS_CONTEXT_KEY = "_additional_headers"
 _SERVER_TIMING_CONTEXT_KEY = "_server_timing_events"
+_SERVER_TIMING_AGGREGATES_CONTEXT_KEY = "_server_timing_aggregates"
 _SERVER_TIMING_HEADER = "server-timing"
+_REQUEST_CACHE_CONTEXT_KEY = "_request_cache"
 _REQUEST_ID_CONTEXT_KEY = "_request_id"
 _REQUEST_ID_HEADER = "x-request-id"
 
@@ -51,6 +53,33 @@ class _ServerTimingEvent:
         return f"{self.name};dur={dur:.6f}"
 
 
+class _AggregatedServerTimingEvent:
+    """
+    Sums up the durations of many occurrences of the same operation into a single Server-Timing entry.
+    """
+
+    def __init__(
+        self,
+        name: str,
+    ) -> None:
+        super().__init__()
+        self.name = name
+        self.count = 0
+        self._total = 0.0
+
+    def record(self, duration: float) -> None:
+        self.count += 1
+        self._total += duration
+
+    def is_terminated(self) -> bool:
+        return self.count > 0
+
+    def __repr__(self) -> str:
+        if not self.is_terminated():
+            return ""
+        return f'{self.name};dur={self._total:.6f};desc="{self.count} calls"'
+
+
 class RequestContext:
     """
     Exposes underlying Request object anywhere via static method.
@@ -88,6 +117,19 @@ class RequestContext:
     def _server_timing_events(cls) -> List[_ServerTimingEvent]:
         return cls.get().setdefault(_SERVER_TIMING_CONTEXT_KEY, [])
 
+    @classmethod
+    def _request_cache(cls, namespace: Hashable) -> Optional[dict]:
+        """
+        Returns the request scoped cache for the given namespace, or None when called outside a request.
+        """
+        if cls.get_request_id() is None:
+            return None
+        return (
+            cls.get()
+            .setdefault(_REQUEST_CACHE_CONTEXT_KEY, {})
+            .setdefault(namespace, {})
+        )
+
     @classmethod
     def _get_server_timing_header(cls) -> str:
         """
@@ -128,6 +170,32 @@ class RequestContext:
         cls._server_timing_events().append(_event)
         return _event
 
+    @classmethod
+    def server_timing_aggregated_event(
+        cls, event_name: str
+    ) -> Optional[_AggregatedServerTimingEvent]:
+        """
+        Returns the request's aggregated event with the given name, to time frequent operations without adding an
+        entry to the Server-Timing response header for each occurrence. Returns None when called outside a request.
+        @param event_name- the server-timing event name
+
+        Example:
+            ```
+            event = RequestContext.server_timing_aggregated_event("my-event")
+            event.record(elapsed)
+            ```
+        The code here above will add the entry `my-event;dur={total elapsed};desc="{count} calls"` to the
+        Server-Timing response header.
+        """
+        if cls.get_request_id() is None:
+            return None
+        aggregates = cls.get().setdefault(_SERVER_TIMING_AGGREGATES_CONTEXT_KEY, {})
+        _event = aggregates.get(event_name)
+        if _event is None:
+            _event = aggregates[event_name] = _AggregatedServerTimingEvent(event_name)
+            cls._server_timing_events().append(_event)
+        return _event
+
     @classmethod
     def server_timing_event_func_decorator(cls, event_name: Optional[str] = None):
         """
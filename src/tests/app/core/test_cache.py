@@ -0,0 +1,360 @@
+import asyncio
+import threading
+import time
+
+import fastapi
+import httpx
+import pytest
+from starlette.testclient import TestClient
+
+from app.core import cache
+from app.core.cache import cached
+from app.core.request_context import RequestContext, setup_request_context
+
+
+def test_cached_process_scope():
+    calls = []
+
+    @cached(maxsize=2)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert square(2) == 4
+    assert square(2) == 4
+    assert calls == [2]
+
+    square(3)
+    square(4)  # evicts 2
+    assert square(2) == 4
+    assert calls == [2, 3, 4, 2]
+
+    info = square.cache_info()
+    assert info.hits == 1
+    assert info.misses == 4
+    assert info.evictions == 2
+    assert info.currsize == 2
+    assert info.hit_rate == pytest.approx(0.2)
+
+
+def test_cached_invalidate():
+    calls = []
+
+    @cached()
+    def lookup(x, y=0):
+        calls.append((x, y))
+        return x + y
+
+    assert lookup(1, y=2) == 3
+    assert lookup(1, y=2) == 3
+    lookup.cache_invalidate(1, y=2)
+    assert lookup(1, y=2) == 3
+    assert calls == [(1, 2), (1, 2)]
+
+    lookup.cache_clear()
+    assert lookup(1, y=2) == 3
+    assert len(calls) == 3
+
+
+def test_cached_ttl_and_stale_while_revalidate(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache, "_now", lambda: now[0])
+    values = iter(["v1", "v2", "v3"])
+    refreshed = threading.Event()
+
+    @cached(ttl=10, stale_ttl=5)
+    def get_value():
+        try:
+            return next(values)
+        finally:
+            refreshed.set()
+
+    assert get_value() == "v1"
+    refreshed.clear()
+
+    now[0] = 12  # stale, refreshed in background
+    assert get_value() == "v1"
+    assert refreshed.wait(timeout=1)
+    assert get_value() == "v2"
+
+    now[0] = 30  # expired
+    assert get_value() == "v3"
+    assert get_value.cache_info().stale_hits == 1
+
+
+def test_cached_async_stampede_protection():
+    calls = []
+
+    @cached()
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x
+
+    async def _run():
+        return await asyncio.gather(*[slow(1) for _ in range(10)])
+
+    assert asyncio.run(_run()) == [1] * 10
+    assert calls == [1]
+
+
+def test_cached_sync_stampede_protection():
+    calls = []
+
+    @cached()
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.05)
+        return x
+
+    threads = [threading.Thread(target=slow, args=(1,)) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+
+
+def test_cached_request_scope():
+    app = fastapi.FastAPI()
+    setup_request_context(app)
+    calls = []
+
+    @cached(scope="request")
+    def get_config():
+        calls.append(1)
+        return "config"
+
+    @app.get("/ok")
+    def ok():
+        return dict(first=get_config(), second=get_config())
+
+    with TestClient(app, raise_server_exceptions=False) as client:
+        res = client.get("/ok")
+        assert res.status_code == 200
+        assert "cache-get_config;dur=" in res.headers.get("server-timing")
+        client.get("/ok")
+
+    assert len(calls) == 2
+    assert get_config.cache_info().hits == 2
+
+
+def test_cached_request_scope_concurrent_requests():
+    app = fastapi.FastAPI()
+    setup_request_context(app)
+
+    @cached(scope="request")
+    async def whoami():
+        await asyncio.sleep(0.01)
+        return RequestContext.get_request_id()
+
+    @app.get("/whoami")
+    async def get_whoami():
+        return dict(request_id=await whoami(), again=await whoami())
+
+    async def _run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://localhost"
+        ) as client:
+            return await asyncio.gather(
+                *[
+                    client.get("/whoami", headers={"x-request-id": f"{i}"})
+                    for i in range(3)
+                ]
+            )
+
+    for i, res in enumerate(asyncio.run(_run())):
+        assert res.json() == dict(request_id=f"{i}", again=f"{i}")
+
+
+def test_cached_server_timing_is_aggregated():
+    app = fastapi.FastAPI()
+    setup_request_context(app)
+
+    @cached()
+    def has_permission(permission):
+        return True
+
+    @app.get("/ok")
+    def ok():
+        return dict(allowed=all(has_permission(i % 10) for i in range(1000)))
+
+    with TestClient(app) as client:
+        res = client.get("/ok")
+        server_timing = res.headers.get("server-timing")
+        assert server_timing.startswith("cache-has_permission;dur=")
+        assert server_timing.endswith(';desc="1000 calls"')
+
+
+def test_cached_async_owner_cancelled():
+    calls = []
+
+    @cached()
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return x
+
+    async def _run():
+        t1 = asyncio.create_task(slow(1))
+        t2 = asyncio.create_task(slow(1))
+        await asyncio.sleep(0.01)
+        t1.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await t1
+        return await t2
+
+    assert asyncio.run(_run()) == 1
+    assert calls == [1]
+
+
+def test_cached_async_stale_refresh_does_not_change_request_value(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache, "_now", lambda: now[0])
+    values = iter(["v1", "v2", "v3"])
+
+    @cached(ttl=10, stale_ttl=5)
+    async def cfg():
+        return next(values)
+
+    app = fastapi.FastAPI()
+    setup_request_context(app)
+
+    @app.get("/cfg")
+    async def get_cfg():
+        first = await cfg()
+        await asyncio.sleep(0.01)  # let the background refresh complete
+        return [first, await cfg()]
+
+    async def _run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://localhost"
+        ) as client:
+            assert (await client.get("/cfg")).json() == ["v1", "v1"]
+            now[0] = 12  # stale, refreshed in background
+            assert (await client.get("/cfg")).json() == ["v1", "v1"]
+            assert (await client.get("/cfg")).json() == ["v2", "v2"]
+
+    asyncio.run(_run())
+
+
+def test_cached_invalidate_during_load():
+    source = {"u": "admin"}
+    started, release = threading.Event(), threading.Event()
+
+    @cached()
+    def get_perm(user):
+        value = source[user]
+        started.set()
+        release.wait(timeout=1)
+        return value
+
+    t = threading.Thread(target=get_perm, args=("u",))
+    t.start()
+    assert started.wait(timeout=1)
+    source["u"] = "guest"
+    get_perm.cache_invalidate("u")
+    release.set()
+    assert get_perm("u") == "guest"
+    t.join()
+    assert get_perm("u") == "guest"
+
+
+def test_cached_async_invalidate_during_load():
+    source = {"u": "admin"}
+
+    @cached()
+    async def get_perm(user):
+        value = source[user]
+        await asyncio.sleep(0.02)
+        return value
+
+    async def _run():
+        t = asyncio.create_task(get_perm("u"))
+        await asyncio.sleep(0.01)
+        source["u"] = "guest"
+        get_perm.cache_invalidate("u")
+        assert await get_perm("u") == "guest"
+        assert await t == "admin"
+        assert await get_perm("u") == "guest"
+
+    asyncio.run(_run())
+
+
+def test_cached_async_multiple_event_loops():
+    calls = []
+
+    @cached()
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return x
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(asyncio.run(slow(1))))
+        for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [1, 1]
+
+
+def test_cached_stale_hits_start_a_single_refresh(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache, "_now", lambda: now[0])
+    submitted = []
+    submit = cache._REFRESH_EXECUTOR.submit
+
+    def _submit(*args):
+        submitted.append(args)
+        return submit(*args)
+
+    monkeypatch.setattr(cache._REFRESH_EXECUTOR, "submit", _submit)
+    calls = []
+    release = threading.Event()
+
+    @cached(ttl=10, stale_ttl=5)
+    def get_value():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(timeout=1)
+        return len(calls)
+
+    assert get_value() == 1
+    now[0] = 12  # stale
+    assert [get_value() for _ in range(10)] == [1] * 10
+    assert len(submitted) == 1
+    release.set()
+    for _ in range(100):
+        if get_value() == 2:
+            break
+        time.sleep(0.01)
+    assert len(calls) == 2
+
+
+def test_cached_recursive_call():
+    @cached()
+    def recursive(x):
+        return recursive(x)
+
+    with pytest.raises(RuntimeError):
+        recursive(1)
+
+    @cached()
+    async def recursive_async(x):
+        return await recursive_async(x)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(recursive_async(1))
+
+
+def test_cached_invalid_args():
+    with pytest.raises(ValueError):
+        cached(scope="foobar")(lambda: None)
+    with pytest.raises(ValueError):
+        cached(stale_ttl=1)(lambda: None)
@@ -1,7 +1,7 @@
 import fastapi
 from starlette.testclient import TestClient
 
-from app.core.cors import setup_cors
+from app.core.cors import CORSMiddleware, setup_cors
 from tests.testutils.mock_environ import mock_environ
 
 
@@ -51,3 +51,135 @@ def test_cors_enabled_with_allow_origin_regex():
         assert res.headers.get("access-control-allow-origin") == "http://localhost:3002"
         res = _get_response(origin="http://localhost:4000")
         assert res.headers.get("access-control-allow-origin") is None
+
+
+def _get_preflight_response(origin=None, **headers):
+    app = fastapi.FastAPI()
+    setup_cors(app)
+    with TestClient(app, raise_server_exceptions=False) as client:
+        return client.options(
+            "/",
+            headers={
+                "origin": origin or "http://example.com",
+                "access-control-request-method": "GET",
+                **headers,
+            },
+        )
+
+
+def test_cors_preflight():
+    with mock_environ(ENABLE_CORS="True", CORS_MAX_AGE="3600"):
+        res = _get_preflight_response(**{"access-control-request-headers": "x-foo"})
+        assert res.status_code == 200
+        assert res.headers.get("access-control-allow-origin") == "http://example.com"
+        assert res.headers.get("access-control-allow-headers") == "x-foo"
+        assert res.headers.get("access-control-allow-credentials") == "true"
+        assert res.headers.get("access-control-max-age") == "3600"
+        assert res.headers.get("vary") == "Origin"
+
+
+def test_cors_preflight_with_allow_headers():
+    with mock_environ(
+        ENABLE_CORS="True",
+        CORS_ALLOW_ORIGIN_REGEX="http://localhost:300\\d",
+        CORS_ALLOW_METHODS="GET,POST",
+        CORS_ALLOW_HEADERS="X-Foo",
+    ):
+        res = _get_preflight_response(
+            origin="http://localhost:3000",
+            **{"access-control-request-headers": "X-Foo"},
+        )
+        assert res.status_code == 200
+        assert res.headers.get("access-control-allow-methods") == "GET, POST"
+        assert (
+            res.headers.get("access-control-allow-headers")
+            == "Accept, Accept-Language, Content-Language, Content-Type, X-Foo"
+        )
+        res = _get_preflight_response(
+            origin="http://localhost:4000",
+            **{"access-control-request-headers": "X-Bar"},
+        )
+        assert res.status_code == 400
+        assert res.text == "Disallowed CORS origin, headers"
+        assert res.headers.get("access-control-allow-origin") is None
+
+
+def test_cors_simple_response_merges_vary_header():
+    app = fastapi.FastAPI()
+
+    @app.get("/")
+    def root():
+        return fastapi.Response("ok", headers={"vary": "Accept-Encoding"})
+
+    app.add_middleware(CORSMiddleware, allow_origins=["http://example.com"])
+    with TestClient(app) as client:
+        for _ in range(2):
+            res = client.get("/", headers={"origin": "http://example.com"})
+            assert (
+                res.headers.get("access-control-allow-origin") == "http://example.com"
+            )
+            assert res.headers.get("vary") == "Accept-Encoding, Origin"
+
+
+def test_cors_preflight_with_spaced_env_lists():
+    with mock_environ(
+        ENABLE_CORS="True",
+        CORS_ALLOW_ORIGINS="http://localhost:3000, http://localhost:3001",
+        CORS_ALLOW_METHODS="get, POST",
+        CORS_ALLOW_HEADERS="X-Foo, X-Bar,",
+    ):
+        res = _get_preflight_response(
+            origin="http://localhost:3001",
+            **{
+                "access-control-request-method": "POST",
+                "access-control-request-headers": "X-Bar",
+            },
+        )
+        assert res.status_code == 200
+        assert res.headers.get("access-control-allow-origin") == "http://localhost:3001"
+        assert res.headers.get("access-control-allow-methods") == "GET, POST"
+
+
+def test_cors_first_origin_header_wins():
+    app = fastapi.FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=["http://localhost:3000"])
+    with TestClient(app) as client:
+        res = client.get(
+            "/",
+            headers=[
+                ("origin", "http://localhost:3000"),
+                ("origin", "http://localhost:4000"),
+            ],
+        )
+        assert res.headers.get("access-control-allow-origin") == "http://localhost:3000"
+
+
+def test_cors_preflight_with_large_request_headers_is_not_cached():
+    app = fastapi.FastAPI()
+    middleware = CORSMiddleware(app, allow_origins=["*"], allow_headers=["*"])
+    requested_headers = ", ".join(f"x-header-{i}" for i in range(500))
+    with TestClient(middleware) as client:
+        res = client.options(
+            "/",
+            headers={
+                "origin": "http://example.com",
+                "access-control-request-method": "GET",
+                "access-control-request-headers": requested_headers,
+            },
+        )
+        assert res.status_code == 200
+        assert res.headers.get("access-control-allow-headers") == requested_headers
+    assert middleware._preflight_response.cache_info().currsize == 0
+    assert middleware.is_allowed_origin.cache_info().currsize == 0
+
+
+def test_cors_simple_response_with_large_origins_is_not_cached():
+    app = fastapi.FastAPI()
+    middleware = CORSMiddleware(app, allow_origin_regex=r"http://.*\.example\.com")
+    with TestClient(middleware, raise_server_exceptions=False) as client:
+        for i in range(50):
+            origin = f"http://{i}{'x' * 3000}.example.com"
+            res = client.get("/", headers={"origin": origin})
+            assert res.headers.get("access-control-allow-origin") == origin
+    assert middleware._simple_response_headers.cache_info().currsize == 0
+    assert middleware.is_allowed_origin.cache_info().currsize == 0
@@ -3,6 +3,7 @@ import pytest_httpserver
 from starlette.testclient import TestClient
 
 from app.app import create_app
+from tests.testutils.async_mock_server import AsyncMockServer
 from tests.testutils.mock_server import MockServer
 
 
@@ -23,3 +24,9 @@ def mock_server(httpserver: pytest_httpserver.HTTPServer):
     server = MockServer(httpserver)
     yield server
     server.clear()
+
+
+@pytest.fixture
+def async_mock_server():
+    with AsyncMockServer(seed=0) as server:
+        yield server
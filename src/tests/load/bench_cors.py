@@ -0,0 +1,85 @@
+"""
+Compares the per-request overhead of app.core.cors.CORSMiddleware with starlette's CORSMiddleware, calling the
+middlewares directly at ASGI level (no client, no network).
+
+Run from the src dir:
+    python -m tests.load.bench_cors
+"""
+
+import asyncio
+import time
+
+from starlette.middleware.cors import CORSMiddleware as StarletteCORSMiddleware
+
+from app.core.cors import CORSMiddleware
+
+_ITERATIONS = 20_000
+
+_CONFIGS = {
+    "allow_origins": dict(allow_origins=["http://localhost:3000"]),
+    "allow_origin_regex": dict(allow_origin_regex=r"https://[a-z0-9-]+\.example\.com"),
+}
+_ORIGINS = {
+    "allow_origins": b"http://localhost:3000",
+    "allow_origin_regex": b"https://my-feature-branch.example.com",
+}
+
+
+async def _app(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def _send(_) -> None:
+    pass
+
+
+def _scope(method: str, headers: list[tuple[bytes, bytes]]) -> dict:
+    return {"type": "http", "method": method, "path": "/", "headers": headers}
+
+
+async def _measure(middleware, scope: dict) -> float:
+    for _ in range(100):
+        await middleware(scope, _receive, _send)
+    start = time.perf_counter()
+    for _ in range(_ITERATIONS):
+        await middleware(scope, _receive, _send)
+    return (time.perf_counter() - start) / _ITERATIONS * 1e6
+
+
+async def main() -> None:
+    print(
+        f"{'config':<20} {'request':<10} {'starlette':>12} {'app':>12} {'speedup':>8}"
+    )
+    for name, config in _CONFIGS.items():
+        kwargs = dict(
+            config, allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
+        )
+        origin = _ORIGINS[name]
+        scopes = {
+            "none": _scope("GET", [(b"host", b"localhost")]),
+            "simple": _scope("GET", [(b"host", b"localhost"), (b"origin", origin)]),
+            "preflight": _scope(
+                "OPTIONS",
+                [
+                    (b"host", b"localhost"),
+                    (b"origin", origin),
+                    (b"access-control-request-method", b"POST"),
+                    (b"access-control-request-headers", b"content-type, x-foo"),
+                ],
+            ),
+        }
+        for request, scope in scopes.items():
+            baseline = await _measure(StarletteCORSMiddleware(_app, **kwargs), scope)
+            current = await _measure(CORSMiddleware(_app, **kwargs), scope)
+            print(
+                f"{name:<20} {request:<10} {baseline:>10.2f}us {current:>10.2f}us {baseline / current:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
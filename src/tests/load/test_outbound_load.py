@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+import itertools
+
+import fastapi
+import httpx
+
+from tests.testutils.async_mock_server import (
+    AsyncMockServer,
+    constant_latency,
+    lognormal_latency,
+)
+from tests.testutils.load_generator import LoadReport, generate_http_load
+
+# Timing assertions are only lower bounds implied by the mock latencies, so they don't depend on the CI machine speed.
+
+
+def _create_proxy_app(upstreams: list[httpx.AsyncClient]) -> fastapi.FastAPI:
+    app = fastapi.FastAPI()
+    clients = itertools.cycle(upstreams)
+
+    @app.get("/proxy/{path:path}")
+    async def proxy(path: str):
+        res = await next(clients).get(f"/{path}")
+        if res.status_code >= 500:
+            raise fastapi.HTTPException(502, "Bad gateway")
+        return fastapi.Response(res.content, media_type=res.headers["content-type"])
+
+    return app
+
+
+def _run_load(upstream_url: str, rps: float, duration: float) -> LoadReport:
+    async def _run():
+        # httpcore scans the whole connection pool on every request, which gets very slow with hundreds of open
+        # connections, so the load is spread over several smaller pools
+        async with contextlib.AsyncExitStack() as stack:
+            upstreams = [
+                await stack.enter_async_context(
+                    httpx.AsyncClient(base_url=upstream_url, timeout=30)
+                )
+                for _ in range(10)
+            ]
+            app = _create_proxy_app(upstreams)
+            return await generate_http_load(
+                app, "GET", "/proxy/data", rps=rps, duration=duration
+            )
+
+    report = asyncio.run(_run())
+    print(report)
+    return report
+
+
+def test_outbound_load(async_mock_server: AsyncMockServer):
+    async_mock_server.respond_with_payload(
+        "/data", size=1024, latency=lognormal_latency(median=0.02, sigma=0.5)
+    )
+
+    report = _run_load(async_mock_server.server_url, rps=200, duration=1)
+    assert report.count == 200
+    assert report.errors == 0
+    assert async_mock_server.request_count == 200
+    assert 0 < report.p50 <= report.p99 <= report.p999
+
+
+def test_outbound_load_with_errors(async_mock_server: AsyncMockServer):
+    async_mock_server.respond_with_json("/data", {"ok": True}, error_rate=0.2)
+
+    report = _run_load(async_mock_server.server_url, rps=100, duration=1)
+    assert report.count == 100
+    assert report.errors == async_mock_server.error_count
+    assert 0 < report.errors < 100
+
+
+def test_outbound_load_high_concurrency(async_mock_server: AsyncMockServer):
+    # requests are fired within ~1s and the upstream holds each of them for 2s, so all of them overlap
+    async_mock_server.respond_with_payload(
+        "/data", size=1024, latency=constant_latency(2)
+    )
+
+    report = _run_load(async_mock_server.server_url, rps=500, duration=1)
+    assert report.count == 500
+    assert report.errors == 0
+    assert async_mock_server.max_in_flight >= 400
+    assert report.p50 >= 2
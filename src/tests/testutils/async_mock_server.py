@@ -0,0 +1,259 @@
+import asyncio
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+import typing
+
+import uvicorn
+
+# A latency distribution returns the seconds to wait before responding, drawing from the given random generator
+LatencyDistribution = typing.Callable[[random.Random], float]
+
+
+def constant_latency(seconds: float) -> LatencyDistribution:
+    return lambda _: seconds
+
+
+def uniform_latency(low: float, high: float) -> LatencyDistribution:
+    return lambda rnd: rnd.uniform(low, high)
+
+
+def exponential_latency(mean: float) -> LatencyDistribution:
+    return lambda rnd: rnd.expovariate(1 / mean)
+
+
+def lognormal_latency(median: float, sigma: float) -> LatencyDistribution:
+    """
+    Long tailed latency, typical of real upstream services.
+    """
+    mu = math.log(median)
+    return lambda rnd: rnd.lognormvariate(mu, sigma)
+
+
+class _Route:
+    def __init__(
+        self,
+        pattern: re.Pattern,
+        response_data: bytes | typing.Callable[[random.Random], bytes],
+        status_code: int,
+        content_type: str,
+        latency: LatencyDistribution | None,
+        error_rate: float,
+        error_status_code: int,
+    ) -> None:
+        super().__init__()
+        self.pattern = pattern
+        self.response_data = response_data
+        self.status_code = status_code
+        self.content_type = content_type
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status_code = error_status_code
+
+
+class AsyncMockServer:
+    """
+    Asyncio based alternative to MockServer, meant to act as a slow upstream under many concurrent connections.
+    The server runs on localhost in a dedicated thread (with its own event loop), so it can be used from both sync
+    and async tests.
+
+    Example:
+        ```
+        with AsyncMockServer(seed=42) as server:
+            server.respond_with_json("/users/.*", {"id": 1}, latency=lognormal_latency(0.05, 0.5), error_rate=0.01)
+            ...
+        ```
+    """
+
+    def __init__(self, host: str = "127.0.0.1", seed: int | None = None):
+        super().__init__()
+        self.host = host
+        self.port: int | None = None
+        self.request_count = 0
+        self.error_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._routes: list[_Route] = []
+        self._server: uvicorn.Server | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def server_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 5.0) -> None:
+        # IPPROTO_TCP makes asyncio set TCP_NODELAY on accepted connections (avoids delayed ACK stalls)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, 0))
+        self.port = sock.getsockname()[1]
+        config = uvicorn.Config(
+            self._asgi_app,
+            interface="asgi3",
+            lifespan="off",
+            log_level="warning",
+            access_log=False,
+            backlog=4096,
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(
+            target=asyncio.run,
+            args=(self._server.serve(sockets=[sock]),),
+            name="async-mock-server",
+            daemon=True,
+        )
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                self.stop()
+                sock.close()
+                raise RuntimeError("mock server failed to start")
+            time.sleep(0.01)
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.should_exit = True
+        if self._thread:
+            self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def clear(self):
+        self._routes.clear()
+        self.request_count = 0
+        self.error_count = 0
+        self.max_in_flight = 0
+
+    def respond_with_data(
+        self,
+        path_regex: str,
+        response_data: str | bytes | typing.Callable[[random.Random], bytes],
+        status_code: int = 200,
+        content_type: str = "text/plain",
+        latency: LatencyDistribution | None = None,
+        error_rate: float = 0.0,
+        error_status_code: int = 503,
+    ):
+        """
+        @param latency- the distribution of the delay before responding, no delay if None
+        @param error_rate- the probability (0..1) of responding with error_status_code instead
+        """
+        if isinstance(response_data, str):
+            response_data = response_data.encode()
+        route = _Route(
+            pattern=re.compile(path_regex, 0),
+            response_data=response_data,
+            status_code=status_code,
+            content_type=content_type,
+            latency=latency,
+            error_rate=error_rate,
+            error_status_code=error_status_code,
+        )
+        # latest registered routes take precedence
+        self._routes.insert(0, route)
+
+    def respond_with_json(
+        self,
+        path_regex: str,
+        response_json: typing.Any,
+        status_code: int = 200,
+        **kwargs,
+    ):
+        response_data = json.dumps(response_json)
+        self.respond_with_data(
+            path_regex,
+            response_data,
+            status_code,
+            content_type="application/json",
+            **kwargs,
+        )
+
+    def respond_with_payload(
+        self,
+        path_regex: str,
+        size: int | typing.Callable[[random.Random], int],
+        status_code: int = 200,
+        **kwargs,
+    ):
+        """
+        Responds with a payload of the given size in bytes, either fixed or drawn from a distribution.
+        """
+        if callable(size):
+            response_data = lambda rnd: b"x" * size(rnd)
+        else:
+            response_data = b"x" * size
+        self.respond_with_data(
+            path_regex,
+            response_data,
+            status_code,
+            content_type="application/octet-stream",
+            **kwargs,
+        )
+
+    def _match(self, path: str) -> _Route | None:
+        for route in self._routes:
+            if route.pattern.fullmatch(path):
+                return route
+        return None
+
+    async def _asgi_app(self, scope, receive, send) -> None:
+        assert scope["type"] == "http"
+        self.request_count += 1
+        # the app runs on a single event loop, so counters need no locking
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await self._handle(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    async def _handle(self, scope, receive, send) -> None:
+        # drain the request body
+        more_body = True
+        while more_body:
+            message = await receive()
+            more_body = message.get("more_body", False)
+
+        route = self._match(scope["path"])
+        if route is None:
+            status_code, content_type, body = 404, "text/plain", b"No handler found"
+        else:
+            if route.latency:
+                await asyncio.sleep(max(route.latency(self._random), 0.0))
+            if route.error_rate and self._random.random() < route.error_rate:
+                self.error_count += 1
+                status_code, content_type, body = (
+                    route.error_status_code,
+                    "text/plain",
+                    b"Injected error",
+                )
+            else:
+                status_code, content_type = route.status_code, route.content_type
+                body = route.response_data
+                if callable(body):
+                    body = body(self._random)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [
+                    (b"content-type", content_type.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,124 @@
+import asyncio
+import dataclasses
+import math
+import time
+import typing
+
+import httpx
+
+
+@dataclasses.dataclass
+class LoadReport:
+    """
+    Latencies are measured from the intended send time, not the actual one, so that a stalled system is not
+    rewarded by sending fewer requests (coordinated omission correction).
+    """
+
+    target_rps: float
+    duration: float
+    latencies: list[float]
+    errors: int
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return (self.count - self.errors) / self.duration if self.duration else 0.0
+
+    def percentile(self, p: float) -> float:
+        """
+        Nearest-rank percentile, @param p between 0 and 100.
+        """
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = max(math.ceil(p / 100 * len(ordered)), 1)
+        return ordered[rank - 1]
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(50)
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(99)
+
+    @property
+    def p999(self) -> float:
+        return self.percentile(99.9)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.count} requests in {self.duration:.2f}s "
+            f"(target {self.target_rps:.0f} rps, throughput {self.throughput:.1f} rps, {self.errors} errors) "
+            f"p50={self.p50 * 1000:.1f}ms p99={self.p99 * 1000:.1f}ms p999={self.p999 * 1000:.1f}ms"
+        )
+
+
+async def generate_load(
+    send: typing.Callable[[], typing.Awaitable[typing.Any]],
+    rps: float,
+    duration: float,
+    is_error: typing.Callable[[typing.Any], bool] | None = None,
+) -> LoadReport:
+    """
+    Open-loop load generator: requests are fired on a fixed schedule at the target rate, regardless of how many are
+    still in flight, as real clients do.
+    @param send- the coroutine function that performs a single request
+    @param is_error- tells whether the result of send is an error (exceptions are always errors)
+    """
+    interval = 1 / rps
+    total = int(rps * duration)
+    latencies: list[float] = []
+    errors = 0
+
+    async def _fire(intended_start: float) -> None:
+        nonlocal errors
+        try:
+            result = await send()
+            if is_error and is_error(result):
+                errors += 1
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - intended_start)
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(total):
+        intended_start = start + i * interval
+        delay = intended_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_fire(intended_start)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    return LoadReport(
+        target_rps=rps, duration=elapsed, latencies=latencies, errors=errors
+    )
+
+
+async def generate_http_load(
+    app: typing.Callable,
+    method: str,
+    url: str,
+    rps: float,
+    duration: float,
+    **request_kwargs,
+) -> LoadReport:
+    """
+    Drives the given ASGI app in-process (no network), see generate_load.
+    Responses with status code >= 500 count as errors.
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://localhost"
+    ) as client:
+        return await generate_load(
+            lambda: client.request(method, url, **request_kwargs),
+            rps=rps,
+            duration=duration,
+            is_error=lambda res: res.status_code >= 500,
+        )